@@ -5,39 +5,43 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from sqlalchemy.orm import DeclarativeBase
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 class Base(DeclarativeBase):
     pass
 
-# Create the Flask app
-app = Flask(__name__)
+# Extensions are bound to an app in create_app
+db = SQLAlchemy(model_class=Base)
+migrate = Migrate()
 
-# Configure the app
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
+def create_app():
+    """Create and configure the Flask app."""
+    # Configure logging
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
-# Database configuration - Use SQLite
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///receipts.db"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app = Flask(__name__)
 
-# File upload configuration
-app.config["UPLOAD_FOLDER"] = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static/uploads")
-app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max file size
+    # Configure the app
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 
-# Ensure upload folder exists
-os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+    # Database configuration - Use SQLite
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///receipts.db"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-# Create the database instance
-db = SQLAlchemy(model_class=Base)
-db.init_app(app)
+    # File upload configuration
+    app.config["UPLOAD_FOLDER"] = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static/uploads")
+    app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max file size
+
+    # Ensure upload folder exists
+    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+
+    # Initialize the database and Flask-Migrate. Tables are created by
+    # running the migrations (`flask db upgrade`), not at startup.
+    db.init_app(app)
+    migrate.init_app(app, db)
 
-# Initialize Flask-Migrate
-migrate = Migrate(app, db)
+    import models  # noqa: F401 - registers the models with SQLAlchemy
+    from routes import bp
+    app.register_blueprint(bp)
 
-# Create database tables
-with app.app_context():
-    from models import ReceiptFile, Receipt, ReceiptItem
-    db.create_all()
-    logger.info("Database tables created")
\ No newline at end of file
+    return app
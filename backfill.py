@@ -0,0 +1,173 @@
+"""
+Backfill command: re-runs receipt extraction for existing ReceiptFile rows,
+e.g. after the Gemini prompt or the fallback parser has changed.
+
+Usage:
+    python backfill.py --outdated --workers 4
+    python backfill.py --since 2025-01-01 --until 2025-03-31
+    python backfill.py --failed --resume
+"""
+import time
+import logging
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from sqlalchemy import or_
+
+from app import create_app, db
+from models import ReceiptFile
+from utils import Checkpoint
+from pipeline import record_processing_error, commit_receipt
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PATH = ".backfill-checkpoint.json"
+
+# How often progress is logged and the checkpoint is written
+REPORT_INTERVAL = 10.0
+
+
+def select_files(since=None, until=None, prompt_version=None, outdated=False, failed=False):
+    """Return the ids of the valid receipt files matching the given filters, oldest first."""
+    query = db.session.query(ReceiptFile.id).filter(ReceiptFile.is_valid.is_(True))
+    if since:
+        query = query.filter(ReceiptFile.created_at >= since)
+    if until:
+        query = query.filter(ReceiptFile.created_at < until)
+    if prompt_version:
+        query = query.filter(ReceiptFile.extraction_version == prompt_version)
+    if outdated:
+        from ocr_helper import EXTRACTION_VERSION
+        query = query.filter(or_(ReceiptFile.extraction_version.is_(None),
+                                 ReceiptFile.extraction_version != EXTRACTION_VERSION))
+    if failed:
+        query = query.filter(or_(ReceiptFile.is_processed.is_(False),
+                                 ReceiptFile.processing_error.isnot(None)))
+    return [row.id for row in query.order_by(ReceiptFile.id)]
+
+
+def _store(file_id, result):
+    """Upsert the extraction result for one file. Returns the checkpoint status."""
+    try:
+        receipt_file = db.session.get(ReceiptFile, file_id)
+        if result.get("success"):
+            commit_receipt(receipt_file, result)
+            return "processed"
+        logger.error(f"Re-extraction failed for file {file_id}: {result.get('error')}")
+        record_processing_error(receipt_file, result)
+        db.session.commit()
+        return "failed"
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Database error storing file {file_id}: {str(e)}")
+        return "error"
+    finally:
+        # Keep the identity map (and cached OCR text) from growing over long runs
+        db.session.expunge_all()
+
+
+def backfill(file_ids, workers=4, use_ocr_cache=True, checkpoint_path=CHECKPOINT_PATH, resume=False):
+    """
+    Re-extract the given files on a pool of ``workers`` threads.
+
+    OCR and Gemini calls run on the workers; database writes happen on the
+    calling thread. Completed ids are written to ``checkpoint_path`` so an
+    interrupted run can be continued with ``resume=True``.
+    """
+    from ocr_helper import process_receipt
+
+    checkpoint = Checkpoint(checkpoint_path)
+    if not resume:
+        checkpoint.entries = {}
+    todo = [file_id for file_id in file_ids if file_id not in checkpoint]
+    logger.info(f"Re-extracting {len(todo)} files ({len(file_ids) - len(todo)} already done) "
+                f"with {workers} workers")
+
+    counts = {"processed": 0, "failed": 0, "error": 0}
+    started = last_report = time.monotonic()
+    max_pending = workers * 2
+    in_flight = {}
+    remaining = iter(todo)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        exhausted = False
+        while in_flight or not exhausted:
+            # Only load the next files once a worker is about to be free
+            while not exhausted and len(in_flight) < max_pending:
+                file_id = next(remaining, None)
+                if file_id is None:
+                    exhausted = True
+                    break
+                receipt_file = db.session.get(ReceiptFile, file_id)
+                ocr_text = receipt_file.ocr_text if use_ocr_cache else None
+                future = executor.submit(process_receipt, receipt_file.file_path, ocr_text)
+                in_flight[future] = file_id
+                db.session.expunge(receipt_file)
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_id = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"success": False, "error": str(e)}
+                status = _store(file_id, result)
+                counts[status] += 1
+                # Database errors are left out of the checkpoint so a resumed run retries them
+                if status != "error":
+                    checkpoint.mark(file_id, status)
+
+            now = time.monotonic()
+            if now - last_report >= REPORT_INTERVAL:
+                checkpoint.save()
+                _report(counts, len(todo), now - started)
+                last_report = now
+    finally:
+        # On an interrupt, drop the queued files instead of running them only
+        # to discard the results; just the calls already running are awaited
+        executor.shutdown(wait=True, cancel_futures=True)
+        checkpoint.save()
+
+    _report(counts, len(todo), time.monotonic() - started)
+    return counts
+
+
+def _report(counts, total, elapsed):
+    done = sum(counts.values())
+    rate = done / elapsed if elapsed > 0 else 0.0
+    logger.info(f"{done}/{total} files ({counts['processed']} processed, {counts['failed']} failed, "
+                f"{counts['error']} errors), {rate:.2f} files/s")
+
+
+def _parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-extract receipt data for existing files.")
+    parser.add_argument("--since", type=_parse_day, help="Only files uploaded on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--until", type=_parse_day, help="Only files uploaded on or before this date (YYYY-MM-DD)")
+    parser.add_argument("--prompt-version", help="Only files extracted with this extraction version")
+    parser.add_argument("--outdated", action="store_true",
+                        help="Only files not extracted with the current EXTRACTION_VERSION")
+    parser.add_argument("--failed", action="store_true", help="Only files whose processing failed or never ran")
+    parser.add_argument("--workers", type=int, default=4, help="Number of files re-extracted concurrently")
+    parser.add_argument("--no-ocr-cache", action="store_true", help="Run OCR again even if cached text exists")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Checkpoint file for resuming")
+    parser.add_argument("--resume", action="store_true", help="Skip files completed by a previous run")
+    args = parser.parse_args()
+
+    until = args.until + timedelta(days=1) if args.until else None
+    with create_app().app_context():
+        file_ids = select_files(since=args.since, until=until, prompt_version=args.prompt_version,
+                                outdated=args.outdated, failed=args.failed)
+        backfill(file_ids, workers=args.workers, use_ocr_cache=not args.no_ocr_cache,
+                 checkpoint_path=args.checkpoint, resume=args.resume)
+
+
+if __name__ == "__main__":
+    main()
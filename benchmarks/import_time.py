@@ -0,0 +1,48 @@
+"""
+Measure cold-start cost: how long a fresh interpreter takes to import the
+web app, and how much the OCR/LLM modules it no longer imports eagerly
+would add on top.
+
+Usage:
+    python benchmarks/import_time.py [--runs 10]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = [
+    ("web app (main)", "import main"),
+    ("web app + OCR/LLM modules", "import main, ocr_helper"),
+]
+
+
+def time_import(statement, runs):
+    """Return the wall-clock times of running ``statement`` in fresh interpreters."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app import time.")
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters per scenario")
+    args = parser.parse_args()
+
+    baseline = statistics.median(time_import("pass", args.runs))
+    print(f"{'interpreter startup':<30} {baseline * 1000:8.1f} ms")
+    for name, statement in SCENARIOS:
+        median = statistics.median(time_import(statement, args.runs))
+        print(f"{name:<30} {median * 1000:8.1f} ms  (+{(median - baseline) * 1000:.1f} ms imports)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import threading
+import logging
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import Receipt, ReceiptItem
+
+logger = logging.getLogger(__name__)
+
+class ReceiptCache:
+    """
+    Thread-safe LRU cache of serialized receipt JSON.
+
+    Entries are stored with the receipt's updated_at so a stale entry is
+    never served, even when the receipt was written by another process
+    (e.g. the watcher or another web worker).
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, receipt_id, version):
+        with self._lock:
+            entry = self._entries.get(receipt_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(receipt_id)
+            return entry[1]
+
+    def set(self, receipt_id, version, body):
+        with self._lock:
+            self._entries[receipt_id] = (version, body)
+            self._entries.move_to_end(receipt_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, receipt_id):
+        with self._lock:
+            self._entries.pop(receipt_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+receipt_cache = ReceiptCache()
+
+# Drop cached receipts as soon as a write to them is committed in this process
+@event.listens_for(Session, "after_flush")
+def _collect_written_receipts(session, flush_context):
+    written = session.info.setdefault("written_receipt_ids", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Receipt) and obj.id is not None:
+            written.add(obj.id)
+        elif isinstance(obj, ReceiptItem) and obj.receipt_id is not None:
+            written.add(obj.receipt_id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_written_receipts(session):
+    for receipt_id in session.info.pop("written_receipt_ids", ()):
+        receipt_cache.invalidate(receipt_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_receipts(session):
+    session.info.pop("written_receipt_ids", None)
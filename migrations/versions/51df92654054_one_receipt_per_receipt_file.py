@@ -0,0 +1,36 @@
+"""One receipt per receipt_file
+
+Revision ID: 51df92654054
+Revises: b17c289bffd1
+Create Date: 2026-10-19 11:48:37.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '51df92654054'
+down_revision = 'b17c289bffd1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Earlier versions stored a new receipt every time a file was processed.
+    # Keep the oldest receipt for each file (the one store_receipt updates)
+    # and drop the rest before enforcing uniqueness.
+    duplicates = """
+        SELECT id FROM receipt
+        WHERE id NOT IN (SELECT MIN(id) FROM receipt GROUP BY receipt_file_id)
+    """
+    op.execute(f"DELETE FROM receipt_item WHERE receipt_id IN ({duplicates})")
+    op.execute(f"DELETE FROM receipt WHERE id IN ({duplicates})")
+
+    with op.batch_alter_table('receipt', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_receipt_receipt_file_id'), ['receipt_file_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('receipt', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_receipt_receipt_file_id'))
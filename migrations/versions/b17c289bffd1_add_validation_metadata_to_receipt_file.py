@@ -0,0 +1,30 @@
+"""Add validation metadata to receipt_file
+
+Revision ID: b17c289bffd1
+Revises: 255433169b0d
+Create Date: 2026-10-19 11:42:10.318201
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b17c289bffd1'
+down_revision = '255433169b0d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('receipt_file', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('page_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('is_encrypted', sa.Boolean(), nullable=True))
+        batch_op.add_column(sa.Column('has_text_layer', sa.Boolean(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('receipt_file', schema=None) as batch_op:
+        batch_op.drop_column('has_text_layer')
+        batch_op.drop_column('is_encrypted')
+        batch_op.drop_column('page_count')
@@ -9,7 +9,15 @@ class ReceiptFile(db.Model):
     file_path = db.Column(db.String(512), nullable=False)
     is_valid = db.Column(db.Boolean, default=False)
     invalid_reason = db.Column(db.String(255), nullable=True)
+    # Filled in by validate_pdf so the PDF does not have to be parsed again
+    page_count = db.Column(db.Integer, nullable=True)
+    is_encrypted = db.Column(db.Boolean, nullable=True)
+    has_text_layer = db.Column(db.Boolean, nullable=True)
     is_processed = db.Column(db.Boolean, default=False)
+    processing_error = db.Column(db.String(255), nullable=True)
+    # OCR output is cached so receipts can be re-extracted without running OCR again
+    ocr_text = db.Column(db.Text, nullable=True)
+    extraction_version = db.Column(db.String(50), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -25,7 +33,12 @@ class ReceiptFile(db.Model):
             'file_path': self.file_path,
             'is_valid': self.is_valid,
             'invalid_reason': self.invalid_reason,
+            'page_count': self.page_count,
+            'is_encrypted': self.is_encrypted,
+            'has_text_layer': self.has_text_layer,
             'is_processed': self.is_processed,
+            'processing_error': self.processing_error,
+            'extraction_version': self.extraction_version,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
@@ -48,7 +61,8 @@ class Receipt(db.Model):
     currency = db.Column(db.String(10), nullable=True)
     
     # Foreign key relationship
-    receipt_file_id = db.Column(db.Integer, db.ForeignKey('receipt_file.id'), nullable=False)
+    # One receipt per file, so concurrent processing runs can't insert duplicates
+    receipt_file_id = db.Column(db.Integer, db.ForeignKey('receipt_file.id'), nullable=False, unique=True, index=True)
     
     # Items relationship
     items = db.relationship('ReceiptItem', backref='receipt', lazy=True, cascade="all, delete-orphan")
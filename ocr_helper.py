@@ -10,15 +10,23 @@ from gemini_helper import extract_receipt_data_from_text, extract_receipt_data_f
 
 logger = logging.getLogger(__name__)
 
-def extract_text_from_pdf(pdf_path):
+# Bump whenever the Gemini prompt or the fallback parser below changes,
+# so existing receipts can be selected for re-extraction (see backfill.py).
+EXTRACTION_VERSION = "1"
+
+# validate_pdf only bounds the first page, so rendering the rest is time-limited
+RENDER_TIMEOUT = 120  # seconds
+
+def extract_text_from_pdf(pdf_path, progress=None):
     """
     Extract text from a PDF file using pytesseract OCR.
+    If given, progress(stage, data) is called after each page.
     """
     try:
         # Convert PDF to images
         with tempfile.TemporaryDirectory() as temp_dir:
             # Convert PDF pages to images
-            images = pdf2image.convert_from_path(pdf_path)
+            images = pdf2image.convert_from_path(pdf_path, timeout=RENDER_TIMEOUT)
             
             # Extract text from each image
             text = []
@@ -30,6 +38,8 @@ def extract_text_from_pdf(pdf_path):
                 # Extract text using pytesseract
                 img_text = pytesseract.image_to_string(Image.open(image_path))
                 text.append(img_text)
+                if progress:
+                    progress("ocr", {"page": i + 1, "pages": len(images)})
             
             # Combine text from all pages
             full_text = "\n\n".join(text)
@@ -39,20 +49,35 @@ def extract_text_from_pdf(pdf_path):
         logger.error(f"OCR extraction error: {str(e)}")
         return {"success": False, "error": str(e)}
 
-def process_receipt(pdf_path):
+def process_receipt(pdf_path, ocr_text=None, progress=None):
     """
     Process a receipt PDF to extract structured data.
-    Uses OCR to extract text and then performs simple parsing.
+    Uses OCR to extract text (unless previously extracted text is passed
+    in) and then extracts the receipt fields from it. If given,
+    progress(stage, data) is called as each page is OCR'd and once the
+    fields have been extracted.
     """
-    try:
+    if ocr_text is None:
         # Extract text with OCR
-        ocr_result = extract_text_from_pdf(pdf_path)
+        ocr_result = extract_text_from_pdf(pdf_path, progress=progress)
         if not ocr_result.get("success"):
             return ocr_result
-        
-        # Get the extracted text
-        text = ocr_result.get("text", "")
-        
+        ocr_text = ocr_result.get("text", "")
+    
+    result = extract_receipt_data(ocr_text)
+    if result.get("success"):
+        result["ocr_text"] = ocr_text
+        result["extraction_version"] = EXTRACTION_VERSION
+        if progress:
+            progress("extracted", {})
+    return result
+
+def extract_receipt_data(text):
+    """
+    Extract structured receipt data from OCR text.
+    Uses Gemini and falls back to simple parsing.
+    """
+    try:
         # Simple fallback extraction in case Gemini API has issues
         try:
             # Try using Gemini first
@@ -0,0 +1,165 @@
+import logging
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import ReceiptFile, Receipt, ReceiptItem
+from utils import validate_pdf, parse_date, parse_amount
+
+logger = logging.getLogger(__name__)
+
+def create_receipt_file(saved):
+    """Create a ReceiptFile record for a file stored by save_file."""
+    receipt_file = ReceiptFile()
+    receipt_file.file_name = saved["filename"]
+    receipt_file.file_path = saved["file_path"]
+    receipt_file.is_valid = False
+    receipt_file.is_processed = False
+    db.session.add(receipt_file)
+    return receipt_file
+
+def record_validation(receipt_file, validation):
+    """Apply a validate_pdf result to a ReceiptFile record."""
+    if validation["valid"]:
+        receipt_file.is_valid = True
+        receipt_file.invalid_reason = None
+    else:
+        receipt_file.is_valid = False
+        receipt_file.invalid_reason = validation.get("error", "Invalid PDF file")
+    receipt_file.page_count = validation.get("pages")
+    receipt_file.is_encrypted = validation.get("encrypted")
+    receipt_file.has_text_layer = validation.get("has_text_layer")
+    receipt_file.updated_at = datetime.utcnow()
+
+def record_processing_error(receipt_file, result):
+    """Record a failed process_receipt result on a ReceiptFile record."""
+    receipt_file.processing_error = (result.get("error") or "Processing failed")[:255]
+    receipt_file.updated_at = datetime.utcnow()
+
+def store_receipt(receipt_file, result):
+    """
+    Create or update the Receipt (and its items) for a process_receipt
+    result and mark the file as processed. Re-processing a file replaces
+    its existing receipt instead of adding a duplicate; extra receipts left
+    by earlier versions, which created one per processing run, are removed.
+    The caller commits the session.
+    """
+    purchased_at = None
+    if result.get("purchased_at"):
+        purchased_at = parse_date(result["purchased_at"])
+
+    total_amount = None
+    if result.get("total_amount"):
+        if isinstance(result["total_amount"], str):
+            total_amount = parse_amount(result["total_amount"])
+        else:
+            total_amount = float(result["total_amount"])
+
+    existing = (Receipt.query.filter_by(receipt_file_id=receipt_file.id)
+                .order_by(Receipt.id).all())
+    receipt = existing[0] if existing else None
+    if len(existing) > 1:
+        logger.warning(f"Removing {len(existing) - 1} duplicate receipts for file {receipt_file.id}")
+        for duplicate in existing[1:]:
+            db.session.delete(duplicate)
+    if receipt is None:
+        receipt = Receipt(receipt_file_id=receipt_file.id)
+        db.session.add(receipt)
+    else:
+        # Replacing only the items would not trigger onupdate
+        receipt.updated_at = datetime.utcnow()
+
+    receipt.file_path = receipt_file.file_path
+    receipt.merchant_name = result.get("merchant_name")
+    receipt.total_amount = total_amount
+    receipt.purchased_at = purchased_at
+    receipt.receipt_number = result.get("receipt_number")
+    receipt.payment_method = result.get("payment_method")
+    receipt.tax_amount = result.get("tax_amount")
+    receipt.currency = result.get("currency")
+
+    # Replace receipt items; the old ones are removed by the delete-orphan cascade
+    items = []
+    if result.get("items") and isinstance(result["items"], list):
+        for item_data in result["items"]:
+            items.append(ReceiptItem(
+                description=item_data.get("description"),
+                quantity=item_data.get("quantity"),
+                unit_price=item_data.get("unit_price"),
+                total_price=item_data.get("total_price")
+            ))
+    receipt.items = items
+
+    # Update receipt file status
+    receipt_file.is_processed = True
+    receipt_file.processing_error = None
+    if result.get("ocr_text") is not None:
+        receipt_file.ocr_text = result["ocr_text"]
+    receipt_file.extraction_version = result.get("extraction_version")
+    receipt_file.updated_at = datetime.utcnow()
+
+    return receipt
+
+def commit_receipt(receipt_file, result):
+    """
+    Store a process_receipt result with store_receipt and commit it.
+    If another process inserted the file's receipt first, the unique
+    constraint on receipt_file_id rejects the insert; the result is then
+    applied to that receipt instead.
+    """
+    receipt = store_receipt(receipt_file, result)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        logger.info(f"Receipt for file {receipt_file.id} was stored concurrently, updating it")
+        receipt = store_receipt(receipt_file, result)
+        db.session.commit()
+    return receipt
+
+def run_pipeline(file_id, progress):
+    """
+    Validate (unless already validated) and process a stored file,
+    reporting each stage through progress(stage, data). Stages are
+    "validated", "ocr" (once per page), "extracted", "stored" and "error".
+    Must be called within an app context.
+    """
+    from ocr_helper import process_receipt
+
+    receipt_file = db.session.get(ReceiptFile, file_id)
+    if receipt_file is None:
+        progress("error", {"error": "File not found"})
+        return
+
+    try:
+        if not (receipt_file.is_valid and receipt_file.page_count is not None):
+            record_validation(receipt_file, validate_pdf(receipt_file.file_path))
+            db.session.commit()
+        progress("validated", {
+            "is_valid": receipt_file.is_valid,
+            "pages": receipt_file.page_count or 0,
+            "error": receipt_file.invalid_reason
+        })
+        if not receipt_file.is_valid:
+            return
+
+        # Don't extract again if a previous run already stored the receipt
+        receipt = (Receipt.query.filter_by(receipt_file_id=receipt_file.id)
+                   .order_by(Receipt.id).first())
+        if receipt_file.is_processed and receipt is not None:
+            progress("stored", {"receipt_id": receipt.id, "receipt": receipt.to_dict()})
+            return
+
+        result = process_receipt(receipt_file.file_path, progress=progress)
+        if not result.get("success"):
+            record_processing_error(receipt_file, result)
+            db.session.commit()
+            progress("error", {"error": result.get("error", "Processing failed")})
+            return
+
+        receipt = commit_receipt(receipt_file, result)
+        progress("stored", {"receipt_id": receipt.id, "receipt": receipt.to_dict()})
+
+    except Exception as e:
+        logger.error(f"Error processing file {file_id}: {str(e)}")
+        db.session.rollback()
+        progress("error", {"error": str(e)})
@@ -1,42 +1,131 @@
 import os
 import json
+import hashlib
 import logging
 import sqlite3
-from datetime import datetime
-from flask import request, jsonify, render_template, url_for, redirect, flash, send_from_directory
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from flask import Blueprint, abort, current_app, make_response, request, jsonify, render_template, url_for, redirect, flash, send_from_directory
+from sqlalchemy.orm import selectinload
 from werkzeug.utils import secure_filename
-from app import app, db
+from app import db
 from models import ReceiptFile, Receipt, ReceiptItem
-from utils import save_file, validate_pdf, parse_date, parse_amount
-from ocr_helper import process_receipt
+from cache import receipt_cache
+from utils import save_file, validate_pdf
+from pipeline import create_receipt_file, record_validation, record_processing_error, commit_receipt, run_pipeline
 
 logger = logging.getLogger(__name__)
 
+bp = Blueprint('main', __name__)
+
+# HTTP caching helpers. Receipts change only when they are (re)processed,
+# which always bumps updated_at, so (id, updated_at) identifies a version.
+def _receipt_etag(versions):
+    """Build an ETag from (id, updated_at) pairs."""
+    digest = hashlib.sha1()
+    for receipt_id, updated_at in versions:
+        digest.update(f"{receipt_id}:{updated_at};".encode())
+    return digest.hexdigest()
+
+def _http_date(updated_at):
+    """Convert a naive UTC timestamp to the second-precision value sent in Last-Modified."""
+    return updated_at.replace(tzinfo=timezone.utc, microsecond=0) if updated_at else None
+
+_template_version = None
+
+def _get_template_version():
+    """Hash the receipt page templates, so a deploy that changes them changes the page ETag."""
+    global _template_version
+    if _template_version is None:
+        digest = hashlib.sha1()
+        for name in ('layout.html', 'receipt_detail.html'):
+            source, _, _ = current_app.jinja_loader.get_source(current_app.jinja_env, name)
+            digest.update(source.encode())
+        _template_version = digest.hexdigest()[:12]
+    return _template_version
+
+def _set_cache_headers(response, etag, last_modified):
+    response.set_etag(etag)
+    # Assigning None would make werkzeug send the current time
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Let clients keep a copy but revalidate it on every request
+    response.cache_control.no_cache = True
+    return response
+
+def _not_modified(etag, last_modified):
+    """Return a 304 response if the client's copy is current, otherwise None."""
+    if request.if_none_match:
+        # If-None-Match uses weak comparison, so tags weakened by a
+        # compressing proxy (W/"...") still match
+        fresh = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        fresh = last_modified <= request.if_modified_since
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    return _set_cache_headers(current_app.response_class(status=304), etag, last_modified)
+
+def _serialize_receipts(versions):
+    """Return the JSON for the given (id, updated_at) pairs, using the receipt cache."""
+    bodies = {}
+    for receipt_id, updated_at in versions:
+        body = receipt_cache.get(receipt_id, updated_at)
+        if body is not None:
+            bodies[receipt_id] = body
+
+    missing = [receipt_id for receipt_id, _ in versions if receipt_id not in bodies]
+    # Load uncached receipts with their items in batches (SQLite limits bound parameters)
+    for start in range(0, len(missing), 500):
+        receipts = (Receipt.query
+                    .filter(Receipt.id.in_(missing[start:start + 500]))
+                    .options(selectinload(Receipt.items)))
+        for receipt in receipts:
+            body = current_app.json.dumps(receipt.to_dict())
+            receipt_cache.set(receipt.id, receipt.updated_at, body)
+            bodies[receipt.id] = body
+
+    return [bodies[receipt_id] for receipt_id, _ in versions if receipt_id in bodies]
+
 # Web routes
-@app.route('/')
+@bp.route('/')
 def index():
     """Render the main application page."""
     return render_template('index.html')
 
-@app.route('/receipt/<int:receipt_id>')
+@bp.route('/receipt/<int:receipt_id>')
 def receipt_detail(receipt_id):
     """Render the receipt detail page."""
-    receipt = Receipt.query.get_or_404(receipt_id)
-    return render_template('receipt_detail.html', receipt=receipt)
+    version = db.session.query(Receipt.id, Receipt.updated_at).filter_by(id=receipt_id).first()
+    if not version:
+        abort(404)
+    
+    # The page also depends on the templates, so their version is part of the
+    # ETag. Last-Modified is not sent, since updated_at alone can't reflect that.
+    etag = f"{_receipt_etag([version])}-{_get_template_version()}"
+    not_modified = _not_modified(etag, None)
+    if not_modified:
+        return not_modified
+    
+    receipt = db.session.get(Receipt, receipt_id)
+    response = make_response(render_template('receipt_detail.html', receipt=receipt))
+    return _set_cache_headers(response, etag, None)
 
-@app.route('/receipts')
+@bp.route('/receipts')
 def receipts_list():
     """Render the receipts list page."""
     receipts = Receipt.query.order_by(Receipt.created_at.desc()).all()
     return render_template('index.html', receipts=receipts)
 
-@app.route('/uploads/<filename>')
+@bp.route('/uploads/<filename>')
 def uploaded_file(filename):
     """Serve the uploaded file."""
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
 
 # API Routes
-@app.route('/api/upload', methods=['POST'])
+@bp.route('/api/upload', methods=['POST'])
 def upload_receipt():
     """API to upload a receipt file."""
     if 'file' not in request.files:
@@ -53,15 +142,8 @@ def upload_receipt():
     
     # Create record in database
     try:
-        # Create database record
-        receipt_file = ReceiptFile()
-        receipt_file.file_name = result["filename"]
-        receipt_file.file_path = result["file_path"]
-        receipt_file.is_valid = False
-        receipt_file.is_processed = False
-        
-        # Add to database and get ID
-        db.session.add(receipt_file)
+        # Create database record and get ID
+        receipt_file = create_receipt_file(result)
         db.session.commit()
         file_id = receipt_file.id
         
@@ -77,7 +159,7 @@ def upload_receipt():
         logger.error(f"Database error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/validate', methods=['POST'])
+@bp.route('/api/validate', methods=['POST'])
 def validate_receipt():
     """API to validate if the uploaded file is a valid PDF."""
     data = request.get_json()
@@ -90,24 +172,19 @@ def validate_receipt():
     if not receipt_file:
         return jsonify({"success": False, "error": "File not found"}), 404
     
-    # Validate the PDF
-    validation = validate_pdf(receipt_file.file_path)
-    
     try:
-        if validation["valid"]:
-            receipt_file.is_valid = True
-            receipt_file.invalid_reason = None
-        else:
-            receipt_file.is_valid = False
-            receipt_file.invalid_reason = validation.get("error", "Invalid PDF file")
-        
-        receipt_file.updated_at = datetime.utcnow()
-        db.session.commit()
+        # Only parse the PDF if it has not been validated before
+        if not (receipt_file.is_valid and receipt_file.page_count is not None):
+            validation = validate_pdf(receipt_file.file_path)
+            record_validation(receipt_file, validation)
+            db.session.commit()
         
         return jsonify({
             "success": True,
             "is_valid": receipt_file.is_valid,
-            "pages": validation.get("pages", 0) if receipt_file.is_valid else 0,
+            "pages": (receipt_file.page_count or 0) if receipt_file.is_valid else 0,
+            "encrypted": receipt_file.is_encrypted,
+            "has_text_layer": receipt_file.has_text_layer,
             "error": receipt_file.invalid_reason
         }), 200
     
@@ -116,7 +193,7 @@ def validate_receipt():
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/process', methods=['POST'])
+@bp.route('/api/process', methods=['POST'])
 def process_receipt_api():
     """API to process a receipt and extract data."""
     data = request.get_json()
@@ -132,55 +209,23 @@ def process_receipt_api():
     if not receipt_file.is_valid:
         return jsonify({"success": False, "error": "Cannot process invalid file"}), 400
     
-    # Process the receipt
+    # Process the receipt. OCR/LLM modules are heavy, so they are only
+    # imported once a receipt actually needs processing.
+    from ocr_helper import process_receipt
     result = process_receipt(receipt_file.file_path)
     
     if not result.get("success"):
+        try:
+            record_processing_error(receipt_file, result)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Database error recording processing failure: {str(e)}")
+            db.session.rollback()
         return jsonify(result), 500
     
     try:
-        # Create receipt record
-        purchased_at = None
-        if result.get("purchased_at"):
-            purchased_at = parse_date(result["purchased_at"])
-        
-        total_amount = None
-        if result.get("total_amount"):
-            if isinstance(result["total_amount"], str):
-                total_amount = parse_amount(result["total_amount"])
-            else:
-                total_amount = float(result["total_amount"])
-        
-        receipt = Receipt(
-            receipt_file_id=receipt_file.id,
-            file_path=receipt_file.file_path,
-            merchant_name=result.get("merchant_name"),
-            total_amount=total_amount,
-            purchased_at=purchased_at,
-            receipt_number=result.get("receipt_number"),
-            payment_method=result.get("payment_method"),
-            tax_amount=result.get("tax_amount"),
-            currency=result.get("currency")
-        )
-        
-        db.session.add(receipt)
-        
-        # Add receipt items if any
-        if result.get("items") and isinstance(result["items"], list):
-            for item_data in result["items"]:
-                item = ReceiptItem(
-                    description=item_data.get("description"),
-                    quantity=item_data.get("quantity"),
-                    unit_price=item_data.get("unit_price"),
-                    total_price=item_data.get("total_price")
-                )
-                receipt.items.append(item)
-        
-        # Update receipt file status
-        receipt_file.is_processed = True
-        receipt_file.updated_at = datetime.utcnow()
-        
-        db.session.commit()
+        # Create or update the receipt record and mark the file as processed
+        receipt = commit_receipt(receipt_file, result)
         
         return jsonify({
             "success": True,
@@ -194,46 +239,160 @@ def process_receipt_api():
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/receipts', methods=['GET'])
+@bp.route('/api/receipts', methods=['GET'])
 def get_receipts():
     """API to get all receipts."""
     try:
-        receipts = Receipt.query.order_by(Receipt.created_at.desc()).all()
-        return jsonify({
-            "success": True,
-            "receipts": [receipt.to_dict() for receipt in receipts]
-        }), 200
+        versions = (db.session.query(Receipt.id, Receipt.updated_at)
+                    .order_by(Receipt.created_at.desc()).all())
+        etag = _receipt_etag(versions)
+        last_modified = _http_date(max((v.updated_at for v in versions), default=None))
+        not_modified = _not_modified(etag, last_modified)
+        if not_modified:
+            return not_modified
+        
+        # Assemble the response from cached per-receipt JSON
+        body = '{"receipts":[' + ','.join(_serialize_receipts(versions)) + '],"success":true}'
+        response = current_app.response_class(body, status=200, mimetype='application/json')
+        return _set_cache_headers(response, etag, last_modified)
     
     except Exception as e:
         logger.error(f"Database error getting receipts: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/receipts/<int:receipt_id>', methods=['GET'])
+@bp.route('/api/receipts/<int:receipt_id>', methods=['GET'])
 def get_receipt(receipt_id):
     """API to get a specific receipt."""
     try:
-        receipt = Receipt.query.get(receipt_id)
-        if not receipt:
+        version = db.session.query(Receipt.id, Receipt.updated_at).filter_by(id=receipt_id).first()
+        if not version:
             return jsonify({"success": False, "error": "Receipt not found"}), 404
         
-        return jsonify({
-            "success": True,
-            "receipt": receipt.to_dict()
-        }), 200
+        etag, last_modified = _receipt_etag([version]), _http_date(version.updated_at)
+        not_modified = _not_modified(etag, last_modified)
+        if not_modified:
+            return not_modified
+        
+        receipt_body = _serialize_receipts([version])
+        if not receipt_body:
+            return jsonify({"success": False, "error": "Receipt not found"}), 404
+        
+        body = '{"receipt":' + receipt_body[0] + ',"success":true}'
+        response = current_app.response_class(body, status=200, mimetype='application/json')
+        return _set_cache_headers(response, etag, last_modified)
     
     except Exception as e:
         logger.error(f"Database error getting receipt {receipt_id}: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Receipts processed for /api/files/<file_id>/events run on this pool, so
+# OCR concurrency per web process stays bounded however many streams are open
+PROCESSING_WORKERS = 4
+SSE_KEEPALIVE = 15  # seconds
+_processing_executor = None
+
+def _get_processing_executor():
+    global _processing_executor
+    if _processing_executor is None:
+        _processing_executor = ThreadPoolExecutor(max_workers=PROCESSING_WORKERS,
+                                                  thread_name_prefix='receipt-processing')
+    return _processing_executor
+
+class _ProcessingJob:
+    """Progress events of one run_pipeline call, replayed to every stream following it."""
+
+    def __init__(self):
+        self.events = []
+        self.finished = False
+        self._condition = threading.Condition()
+
+    def publish(self, stage, data):
+        with self._condition:
+            self.events.append((stage, data))
+            self._condition.notify_all()
+
+    def finish(self):
+        with self._condition:
+            self.finished = True
+            self._condition.notify_all()
+
+    def follow(self, timeout):
+        """Yield every event from the start; yields None if nothing arrives within timeout."""
+        index = 0
+        while True:
+            with self._condition:
+                if index == len(self.events) and not self.finished:
+                    self._condition.wait(timeout)
+                new_events = self.events[index:]
+                finished = self.finished
+            index += len(new_events)
+            if not new_events and not finished:
+                yield None
+            yield from new_events
+            if finished:
+                return
+
+# Running jobs by file id, so a reconnect, a refresh or a second tab
+# follows the run in progress instead of extracting the file again
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def _run_job(app, file_id, job):
+    try:
+        # Keeps running if the client disconnects, so the receipt is still stored
+        with app.app_context():
+            run_pipeline(file_id, job.publish)
+    finally:
+        with _jobs_lock:
+            _jobs.pop(file_id, None)
+        job.finish()
+
+def _get_or_start_job(file_id):
+    with _jobs_lock:
+        job = _jobs.get(file_id)
+        if job is None:
+            job = _ProcessingJob()
+            _jobs[file_id] = job
+            _get_processing_executor().submit(_run_job, current_app._get_current_object(), file_id, job)
+        return job
+
+def _sse(event, data):
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@bp.route('/api/files/<int:file_id>/events', methods=['GET'])
+def receipt_events(file_id):
+    """API to validate and process an uploaded file, streaming progress as server-sent events."""
+    receipt_file = db.session.get(ReceiptFile, file_id)
+    if not receipt_file:
+        return jsonify({"success": False, "error": "File not found"}), 404
+    
+    saved = {"file_id": receipt_file.id, "file_name": receipt_file.file_name}
+    job = _get_or_start_job(file_id)
+    
+    def stream():
+        yield _sse("saved", saved)
+        for event in job.follow(SSE_KEEPALIVE):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield _sse(*event)
+        yield _sse("done", {})
+    
+    return current_app.response_class(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # don't let a reverse proxy buffer the stream
+    })
+
 # Error handlers
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     return jsonify({"success": False, "error": "Resource not found"}), 404
 
-@app.errorhandler(400)
+@bp.app_errorhandler(400)
 def bad_request(error):
     return jsonify({"success": False, "error": "Bad request"}), 400
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(error):
     return jsonify({"success": False, "error": "Internal server error"}), 500
\ No newline at end of file
@@ -1,6 +1,7 @@
 // Global variables
 let currentFileId = null;
 let currentReceiptId = null;
+let receiptsEtag = null;
 
 // Initialize Toast component
 const toastElement = document.getElementById('alertToast');
@@ -139,60 +140,23 @@ if (uploadForm) {
                 throw uploadError;
             }
             
-            // Step 2: Validate PDF
+            // Steps 2 and 3: validate and process, with progress streamed from the server
             updateStepStatus(2, 'processing');
             
-            const validateResponse = await fetch('/api/validate', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ file_id: currentFileId })
-            });
-            
-            const validateResult = await validateResponse.json();
-            
-            if (!validateResponse.ok || !validateResult.success) {
-                throw new Error(validateResult.error || 'Failed to validate PDF');
-            }
-            
-            if (!validateResult.is_valid) {
-                updateStepStatus(2, 'error');
-                showNotification('Invalid PDF', validateResult.error || 'The uploaded file is not a valid PDF', 'error');
+            const receipt = await streamProcessing(currentFileId);
+            if (!receipt) {
                 return;
             }
             
-            updateStepStatus(2, 'success');
-            showNotification('Validation Complete', 'PDF validation successful', 'success');
-            
-            // Step 3: Process receipt
-            updateStepStatus(3, 'processing');
-            
-            const processResponse = await fetch('/api/process', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ file_id: currentFileId })
-            });
-            
-            const processResult = await processResponse.json();
-            
-            if (!processResponse.ok || !processResult.success) {
-                throw new Error(processResult.error || 'Failed to process receipt');
-            }
-            
             updateStepStatus(3, 'success');
             showNotification('Processing Complete', 'Receipt data extracted successfully', 'success');
             
             // Save the receipt ID
-            currentReceiptId = processResult.receipt_id;
+            currentReceiptId = receipt.id;
             
-            // Display extracted data
-            displayReceiptData(processResult.receipt_data);
-            
-            // Reload the receipts table
-            loadReceipts();
+            // Display extracted data and add it to the receipts table
+            displayReceiptData(receipt);
+            upsertReceiptRow(receipt);
             
         } catch (error) {
             console.error('Processing error:', error);
@@ -205,6 +169,64 @@ if (uploadForm) {
     });
 }
 
+// Validate and process an uploaded file, following its progress events.
+// Resolves with the stored receipt, or null if the PDF is invalid.
+function streamProcessing(fileId) {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`/api/files/${fileId}/events`);
+        const parse = (event) => JSON.parse(event.data);
+        let step = 2;
+        
+        source.addEventListener('validated', (event) => {
+            const data = parse(event);
+            if (!data.is_valid) {
+                source.close();
+                updateStepStatus(2, 'error');
+                showNotification('Invalid PDF', data.error || 'The uploaded file is not a valid PDF', 'error');
+                resolve(null);
+                return;
+            }
+            updateStepStatus(2, 'success');
+            showNotification('Validation Complete', 'PDF validation successful', 'success');
+            step = 3;
+            updateStepStatus(3, 'processing');
+        });
+        
+        source.addEventListener('ocr', (event) => {
+            const data = parse(event);
+            const statusElement = document.getElementById('step3-status');
+            if (statusElement) {
+                statusElement.textContent = `OCR page ${data.page}/${data.pages}`;
+            }
+        });
+        
+        source.addEventListener('extracted', () => {
+            const statusElement = document.getElementById('step3-status');
+            if (statusElement) {
+                statusElement.textContent = 'Saving';
+            }
+        });
+        
+        source.addEventListener('stored', (event) => {
+            source.close();
+            resolve(parse(event).receipt);
+        });
+        
+        // Named 'error' events come from the server; plain ones mean the connection failed
+        source.addEventListener('error', (event) => {
+            source.close();
+            updateStepStatus(step, 'error');
+            const message = event.data ? parse(event).error : 'Lost connection to the server';
+            reject(new Error(message || 'Failed to process receipt'));
+        });
+        
+        source.addEventListener('done', () => {
+            source.close();
+            reject(new Error('Processing finished without a receipt'));
+        });
+    });
+}
+
 // Display extracted receipt data
 function displayReceiptData(receiptData) {
     const resultsSection = document.getElementById('processingResults');
@@ -286,15 +308,80 @@ function displayReceiptData(receiptData) {
     }
 }
 
+// Build a row for the receipts table
+function createReceiptRow(receipt) {
+    const row = document.createElement('tr');
+    
+    const idCell = document.createElement('td');
+    idCell.textContent = receipt.id;
+    
+    const merchantCell = document.createElement('td');
+    merchantCell.textContent = receipt.merchant_name || 'Unknown';
+    
+    const dateCell = document.createElement('td');
+    dateCell.textContent = receipt.purchased_at 
+        ? new Date(receipt.purchased_at).toLocaleDateString()
+        : 'N/A';
+    
+    const amountCell = document.createElement('td');
+    amountCell.textContent = receipt.total_amount 
+        ? `${receipt.currency || ''} ${receipt.total_amount.toFixed(2)}`
+        : 'N/A';
+    
+    const actionsCell = document.createElement('td');
+    const viewButton = document.createElement('a');
+    viewButton.href = `/receipt/${receipt.id}`;
+    viewButton.className = 'btn btn-sm btn-outline-primary me-2';
+    viewButton.innerHTML = '<i class="fas fa-eye me-1"></i> View';
+    
+    actionsCell.appendChild(viewButton);
+    
+    row.appendChild(idCell);
+    row.appendChild(merchantCell);
+    row.appendChild(dateCell);
+    row.appendChild(amountCell);
+    row.appendChild(actionsCell);
+    row.dataset.receiptId = receipt.id;
+    
+    return row;
+}
+
+// Add a newly processed receipt to the receipts table, or refresh its row
+function upsertReceiptRow(receipt) {
+    const receiptsTable = document.querySelector('#receiptsTable tbody');
+    if (!receiptsTable) return;
+    
+    const row = createReceiptRow(receipt);
+    const existing = receiptsTable.querySelector(`tr[data-receipt-id="${receipt.id}"]`);
+    if (existing) {
+        existing.replaceWith(row);
+        return;
+    }
+    
+    // Drop the "No receipts found" placeholder
+    if (!receiptsTable.querySelector('tr[data-receipt-id]')) {
+        receiptsTable.innerHTML = '';
+    }
+    receiptsTable.prepend(row);
+}
+
 // Load receipts into the table
 async function loadReceipts() {
     try {
-        const response = await fetch('/api/receipts');
+        // Revalidate with the server; an unchanged list comes back as 304
+        // and is served from the browser cache
+        const response = await fetch('/api/receipts', { cache: 'no-cache' });
+        const etag = response.headers.get('ETag');
+        if (response.ok && etag && etag === receiptsEtag) {
+            return;
+        }
+        
         const data = await response.json();
         
         if (!response.ok || !data.success) {
             throw new Error(data.error || 'Failed to load receipts');
         }
+        receiptsEtag = etag;
         
         const receiptsTable = document.querySelector('#receiptsTable tbody');
         if (!receiptsTable) return;
@@ -313,39 +400,7 @@ async function loadReceipts() {
         }
         
         data.receipts.forEach(receipt => {
-            const row = document.createElement('tr');
-            
-            const idCell = document.createElement('td');
-            idCell.textContent = receipt.id;
-            
-            const merchantCell = document.createElement('td');
-            merchantCell.textContent = receipt.merchant_name || 'Unknown';
-            
-            const dateCell = document.createElement('td');
-            dateCell.textContent = receipt.purchased_at 
-                ? new Date(receipt.purchased_at).toLocaleDateString()
-                : 'N/A';
-            
-            const amountCell = document.createElement('td');
-            amountCell.textContent = receipt.total_amount 
-                ? `${receipt.currency || ''} ${receipt.total_amount.toFixed(2)}`
-                : 'N/A';
-            
-            const actionsCell = document.createElement('td');
-            const viewButton = document.createElement('a');
-            viewButton.href = `/receipt/${receipt.id}`;
-            viewButton.className = 'btn btn-sm btn-outline-primary me-2';
-            viewButton.innerHTML = '<i class="fas fa-eye me-1"></i> View';
-            
-            actionsCell.appendChild(viewButton);
-            
-            row.appendChild(idCell);
-            row.appendChild(merchantCell);
-            row.appendChild(dateCell);
-            row.appendChild(amountCell);
-            row.appendChild(actionsCell);
-            
-            receiptsTable.appendChild(row);
+            receiptsTable.appendChild(createReceiptRow(receipt));
         });
         
     } catch (error) {
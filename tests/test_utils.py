@@ -0,0 +1,93 @@
+import time
+import zlib
+
+from utils import VALIDATION_TIMEOUT, _quick_check_pdf, validate_pdf
+
+
+def _deflate_bomb(size):
+    """Compress ``size`` zero bytes without holding them in memory."""
+    compressor = zlib.compressobj(9)
+    chunk = bytes(1024 * 1024)
+    data = [compressor.compress(chunk) for _ in range(size // len(chunk))]
+    data.append(compressor.flush())
+    return b"".join(data)
+
+
+def _stream(dictionary, data):
+    return b"<< %s /Length %d >>\nstream\n%s\nendstream" % (dictionary, len(data), data)
+
+
+def _build_pdf(objects, trailer=b""):
+    """Build a PDF with a single classic xref table from numbered object bodies."""
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R %s >>\n" % (len(objects) + 1, trailer)
+    out += b"startxref\n%d\n%%%%EOF\n" % xref
+    return bytes(out)
+
+
+def _page_objects(content=b"BT ET", media_box=b"[0 0 612 792]"):
+    return [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox %s /Contents 4 0 R >>" % media_box,
+        _stream(b"", content),
+    ]
+
+
+def test_plain_pdf_is_parsed_in_process(tmp_path):
+    path = tmp_path / "plain.pdf"
+    path.write_bytes(_build_pdf(_page_objects()))
+
+    assert _quick_check_pdf(str(path)) == (None, False)
+    assert validate_pdf(str(path))["valid"]
+
+
+def test_padded_trailer_with_xref_stream_bomb_is_sandboxed(tmp_path):
+    objects = _page_objects()
+    objects.append(_stream(b"/Type /XRef /Size 6 /W [1 2 1] /Filter /FlateDecode",
+                           _deflate_bomb(512 * 1024 * 1024)))
+    # The padding pushes /XRefStm out of the last 2KB of the file
+    xref_stream = _build_pdf(objects).index(b"5 0 obj")
+    pdf = _build_pdf(objects, trailer=b"/XRefStm %d /Pad (%s)" % (xref_stream, b"x" * 4096))
+    path = tmp_path / "bomb.pdf"
+    path.write_bytes(pdf)
+
+    assert _quick_check_pdf(str(path)) == (None, True)
+    started = time.monotonic()
+    validate_pdf(str(path))
+    assert time.monotonic() - started < VALIDATION_TIMEOUT + 5
+
+
+def test_unknown_trailer_keys_are_sandboxed(tmp_path):
+    path = tmp_path / "prev.pdf"
+    path.write_bytes(_build_pdf(_page_objects(), trailer=b"/Prev 9"))
+
+    assert _quick_check_pdf(str(path)) == (None, True)
+
+
+def test_content_stream_bomb_is_rejected(tmp_path):
+    objects = _page_objects()
+    objects[3] = _stream(b"/Filter /FlateDecode", _deflate_bomb(600 * 1024 * 1024))
+    path = tmp_path / "content-bomb.pdf"
+    path.write_bytes(_build_pdf(objects))
+
+    result = validate_pdf(str(path))
+    assert not result["valid"]
+    assert "content" in result["error"]
+
+
+def test_oversized_media_box_is_rejected(tmp_path):
+    path = tmp_path / "huge-page.pdf"
+    path.write_bytes(_build_pdf(_page_objects(media_box=b"[0 0 14400 14400]")))
+
+    result = validate_pdf(str(path))
+    assert not result["valid"]
+    assert "too large" in result["error"]
@@ -1,14 +1,27 @@
+import io
 import os
+import re
+import json
+import time
 import uuid
-import PyPDF2
+import zlib
 import logging
 import sqlite3
+import multiprocessing
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from flask import current_app
 
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
 logger = logging.getLogger(__name__)
 
+# Fork where available so the validation child does not re-import the app
+_mp_context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+
 def allowed_file(filename):
     """Check if the file is a PDF."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() == 'pdf'
@@ -29,15 +42,230 @@ def save_file(file):
         logger.error(f"Error saving file: {str(e)}")
         return {"success": False, "error": str(e)}
 
+# Limits for PDF validation. Receipts are short documents, so anything
+# far outside these bounds is rejected rather than parsed.
+MAX_PDF_BYTES = 16 * 1024 * 1024
+MAX_PDF_PAGES = 100
+VALIDATION_TIMEOUT = 10  # seconds
+VALIDATION_MEMORY_LIMIT = 256 * 1024 * 1024  # bytes
+# The first page is rendered for OCR, so its size and content are bounded too
+MAX_PAGE_SIDE = 14400  # points (200in), the PDF implementation limit
+MAX_PAGE_AREA = 36 * 36 * 72 * 72  # points², about 50 megapixels at 200dpi
+MAX_CONTENT_BYTES = 8 * 1024 * 1024  # decoded content streams of the first page
+# Files up to this size with a plain xref table are parsed without a child process
+IN_PROCESS_MAX_BYTES = 2 * 1024 * 1024
+_STARTXREF_RE = re.compile(rb'startxref\s+(\d+)')
+_FINAL_STARTXREF_RE = re.compile(rb'startxref\s+(\d+)\s+%%EOF\s*$')
+_XREF_SUBSECTION_RE = re.compile(rb'(\d+)[ \t]+(\d+)\s+')
+_XREF_ENTRIES_RE = re.compile(rb'(?:\d{10} \d{5} [nf](?: \r| \n|\r\n))*')
+# Trailer keys that do not make PyPDF2 read any further xref sections
+_PLAIN_TRAILER_KEYS = {"/Size", "/Root", "/Info", "/ID", "/Encrypt"}
+
+def _has_plain_xref(data):
+    """
+    Check that ``data``, read from one byte before the startxref offset,
+    is a single well-formed classic xref table whose trailer has no /Prev,
+    /XRefStm or other unknown keys.
+    """
+    from PyPDF2.generic import read_object
+
+    if data[:1] not in (b'\r', b'\n', b' ', b'\t') or data[1:5] != b'xref':
+        return False
+
+    # Walk the subsections exactly as PyPDF2 does (fixed 20-byte entries),
+    # so the trailer checked here is the one it will read
+    pos = 5
+    while True:
+        while data[pos:pos + 1].isspace():
+            pos += 1
+        if data.startswith(b'trailer', pos):
+            break
+        match = _XREF_SUBSECTION_RE.match(data, pos)
+        if not match:
+            return False
+        end = match.end() + 20 * int(match.group(2))
+        if end > len(data) or _XREF_ENTRIES_RE.fullmatch(data, match.end(), end) is None:
+            return False
+        pos = end
+
+    try:
+        trailer = read_object(io.BytesIO(data[pos + 7:].lstrip()), None)
+    except Exception:
+        return False
+    return isinstance(trailer, dict) and set(trailer.keys()) <= _PLAIN_TRAILER_KEYS
+
+def _quick_check_pdf(file_path):
+    """
+    Cheap structural check that reads the start and end of the file and,
+    for small files, the final xref table and trailer. Returns (error,
+    needs_sandbox): an error message, or None if the file looks like a
+    complete PDF, and whether parsing it could be expensive.
+    """
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return "File is empty", False
+    if size > MAX_PDF_BYTES:
+        return f"PDF is larger than {MAX_PDF_BYTES // (1024 * 1024)}MB", False
+
+    with open(file_path, 'rb') as file:
+        head = file.read(1024)
+        file.seek(max(0, size - 2048))
+        tail = file.read()
+
+        if b'%PDF-' not in head:
+            return "Missing PDF header", False
+        # Truncated or partially written files have no end-of-file marker
+        if b'%%EOF' not in tail or not _STARTXREF_RE.search(tail):
+            return "PDF is truncated (missing trailer)", False
+
+        # A single classic xref table cannot reference compressed object
+        # streams, so reading the page tree decompresses nothing and is
+        # safe to do in-process. Xref streams, hybrid files, incremental
+        # updates and anything not parsed here are parsed in the sandbox.
+        match = _FINAL_STARTXREF_RE.search(tail)
+        if size > IN_PROCESS_MAX_BYTES or not match or not 0 < int(match.group(1)) < size:
+            return None, True
+        file.seek(int(match.group(1)) - 1)
+        plain = _has_plain_xref(file.read())
+
+    return None, not plain
+
+def _resolve(node, key):
+    """Get a dictionary value, following an indirect reference if needed."""
+    value = node.get(key)
+    return value.get_object() if value is not None else None
+
+def _content_size(contents, limit):
+    """
+    Decoded size of a page's content streams, decoding at most ``limit + 1``
+    bytes so that compression bombs are never inflated. Filters other than
+    FlateDecode are not decoded; their raw size is counted instead.
+    """
+    total = 0
+    streams = contents if isinstance(contents, list) else [contents]
+    for stream in streams:
+        stream = stream.get_object()
+        data = stream._data
+        filters = _resolve(stream, "/Filter") or []
+        for name in filters if isinstance(filters, list) else [filters]:
+            if name not in ("/FlateDecode", "/Fl"):
+                break
+            try:
+                data = zlib.decompressobj().decompress(data, limit - total + 1)
+            except zlib.error:
+                break
+        total += len(data)
+        if total > limit:
+            break
+    return total
+
+def _read_pdf_info(source):
+    """Read page count, encryption and text-layer flags with PyPDF2."""
+    import PyPDF2
+
+    reader = PyPDF2.PdfReader(source, strict=False)
+    encrypted = reader.is_encrypted
+    if encrypted and not reader.decrypt(""):
+        return {"valid": False, "encrypted": True, "error": "PDF is password protected"}
+
+    # Read the page count from the root of the page tree instead of
+    # len(reader.pages), which resolves every page object
+    pages_root = _resolve(_resolve(reader.trailer, "/Root"), "/Pages")
+    num_pages = int(_resolve(pages_root, "/Count") or 0)
+    if num_pages < 1:
+        return {"valid": False, "encrypted": encrypted, "error": "PDF has no pages"}
+    if num_pages > MAX_PDF_PAGES:
+        return {"valid": False, "encrypted": encrypted,
+                "error": f"PDF has {num_pages} pages (limit is {MAX_PDF_PAGES})"}
+
+    # Descend to the first page; fonts and the media box may be inherited
+    # from any ancestor
+    node, has_fonts, media_box = pages_root, False, None
+    for _ in range(32):
+        resources = _resolve(node, "/Resources")
+        if resources is not None and _resolve(resources, "/Font"):
+            has_fonts = True
+        media_box = _resolve(node, "/MediaBox") or media_box
+        kids = _resolve(node, "/Kids")
+        if _resolve(node, "/Type") != "/Pages" or not kids:
+            break
+        node = kids[0].get_object()
+
+    # Reject first pages that would be too expensive to render for OCR
+    if media_box is not None:
+        unit = float(_resolve(node, "/UserUnit") or 1)
+        llx, lly, urx, ury = (float(value.get_object()) for value in media_box)
+        width, height = abs(urx - llx) * unit, abs(ury - lly) * unit
+        if max(width, height) > MAX_PAGE_SIDE or width * height > MAX_PAGE_AREA:
+            return {"valid": False, "encrypted": encrypted,
+                    "error": f"PDF page is too large ({width:.0f}x{height:.0f}pt)"}
+    contents = _resolve(node, "/Contents")
+    if contents is not None and _content_size(contents, MAX_CONTENT_BYTES) > MAX_CONTENT_BYTES:
+        return {"valid": False, "encrypted": encrypted,
+                "error": f"PDF page content is larger than {MAX_CONTENT_BYTES // (1024 * 1024)}MB"}
+
+    return {"valid": True, "pages": num_pages, "encrypted": encrypted, "has_text_layer": has_fonts}
+
+def _inspect_pdf(file_path, conn):
+    """
+    Run _read_pdf_info in a child process so that pathological files
+    cannot exhaust the worker's memory or time.
+    """
+    try:
+        if resource is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (VALIDATION_MEMORY_LIMIT, VALIDATION_MEMORY_LIMIT))
+        conn.send(_read_pdf_info(file_path))
+    except MemoryError:
+        conn.send({"valid": False, "error": "PDF exceeds the validation memory limit"})
+    except Exception as e:
+        conn.send({"valid": False, "error": str(e)})
+    finally:
+        conn.close()
+
+def _inspect_pdf_sandboxed(file_path):
+    """Run _inspect_pdf in a child process with a time and memory budget."""
+    # Imported before forking so the child process does not import it again
+    import PyPDF2  # noqa: F401
+
+    parent_conn, child_conn = _mp_context.Pipe(duplex=False)
+    process = _mp_context.Process(target=_inspect_pdf, args=(file_path, child_conn), daemon=True)
+    process.start()
+    child_conn.close()
+    try:
+        if not parent_conn.poll(VALIDATION_TIMEOUT):
+            return {"valid": False, "error": "PDF validation timed out"}
+        return parent_conn.recv()
+    except EOFError:
+        # The child died without reporting, e.g. killed for exceeding its limits
+        return {"valid": False, "error": "PDF could not be parsed within resource limits"}
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        parent_conn.close()
+
 def validate_pdf(file_path):
-    """Validate if the file is a valid PDF."""
+    """
+    Validate if the file is a valid PDF.
+    A cheap header/trailer check rejects malformed files first. Small
+    files with a plain xref table are then parsed in-process; anything
+    else is parsed in a child process within a time and memory budget.
+    """
     try:
-        # Try to open and read the PDF
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            # Check if we can get the number of pages (basic validation)
-            num_pages = len(reader.pages)
-            return {"valid": True, "pages": num_pages}
+        error, needs_sandbox = _quick_check_pdf(file_path)
+        if error:
+            logger.error(f"PDF validation error: {error}")
+            return {"valid": False, "error": error}
+
+        if needs_sandbox:
+            result = _inspect_pdf_sandboxed(file_path)
+        else:
+            with open(file_path, 'rb') as file:
+                result = _read_pdf_info(file)
+
+        if not result["valid"]:
+            logger.error(f"PDF validation error: {result['error']}")
+        return result
     except Exception as e:
         logger.error(f"PDF validation error: {str(e)}")
         return {"valid": False, "error": str(e)}
@@ -71,4 +299,34 @@ def parse_amount(amount_str):
         cleaned = amount_str.replace('$', '').replace('€', '').replace('£', '').replace(',', '').strip()
         return float(cleaned)
     except ValueError:
-        return None
\ No newline at end of file
+        return None
+
+class Checkpoint:
+    """Small JSON file recording which work items have already been handled."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable checkpoint {path}: {str(e)}")
+
+    def __contains__(self, key):
+        return str(key) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def mark(self, key, status):
+        """Record a handled item. Call save() to persist it."""
+        self.entries[str(key)] = {"status": status, "at": time.time()}
+
+    def save(self):
+        # Write to a temporary file first so a crash never leaves a truncated checkpoint
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
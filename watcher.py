@@ -0,0 +1,279 @@
+"""
+Ingestion daemon: watches a drop directory for PDF receipts and feeds them
+through the same save/validate/process pipeline as the HTTP API.
+
+Usage:
+    python watcher.py /path/to/drop --workers 2
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import current_app
+from werkzeug.datastructures import FileStorage
+
+from app import create_app, db
+from utils import allowed_file, save_file, validate_pdf, Checkpoint
+from pipeline import create_receipt_file, record_validation, record_processing_error, store_receipt
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # watchdog is optional, fall back to polling
+    Observer = None
+    FileSystemEventHandler = object
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = ".ingest-checkpoint.json"
+
+# Files whose ingestion failed (e.g. while the database is unavailable) are
+# retried after RETRY_DELAY seconds, doubling after each failure
+RETRY_DELAY = 30.0
+MAX_RETRY_DELAY = 3600.0
+
+
+def _checkpoint_key(path, stat):
+    """Identify a drop file by name, size and mtime so replaced files are re-ingested."""
+    return f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class _DropHandler(FileSystemEventHandler):
+    """Collect paths reported by inotify (via watchdog) for the main loop."""
+
+    def __init__(self, changed, wake):
+        self.changed = changed
+        self.wake = wake
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        self.changed.add(getattr(event, "dest_path", None) or event.src_path)
+        self.wake.set()
+
+
+def _is_candidate(name):
+    """Skip hidden, temporary and non-PDF files."""
+    return not name.startswith(".") and allowed_file(name)
+
+
+def _discard(path):
+    """Remove an upload copy that no ReceiptFile row refers to."""
+    try:
+        os.remove(path)
+    except OSError as e:
+        logger.warning(f"Could not remove {path}: {str(e)}")
+
+
+def _ingest(app, path):
+    """
+    Copy a drop file into the upload folder, validate and process it.
+    Runs on a worker thread; database writes happen on the main thread.
+    """
+    from ocr_helper import process_receipt
+
+    with app.app_context():
+        with open(path, "rb") as stream:
+            saved = save_file(FileStorage(stream=stream, filename=os.path.basename(path)))
+        if not saved["success"]:
+            return {"saved": saved}
+
+        try:
+            validation = validate_pdf(saved["file_path"])
+            result = process_receipt(saved["file_path"]) if validation["valid"] else None
+        except Exception:
+            _discard(saved["file_path"])
+            raise
+        return {"saved": saved, "validation": validation, "result": result}
+
+
+def _record(outcome):
+    """Store the outcome of _ingest in the database. Returns the checkpoint status."""
+    saved = outcome["saved"]
+    if not saved["success"]:
+        logger.error(f"Could not save drop file: {saved.get('error')}")
+        return "error"
+
+    try:
+        receipt_file = create_receipt_file(saved)
+        db.session.flush()
+        record_validation(receipt_file, outcome["validation"])
+
+        result = outcome["result"]
+        if result is None:
+            status = "invalid"
+        elif result.get("success"):
+            store_receipt(receipt_file, result)
+            status = "processed"
+        else:
+            logger.error(f"Processing failed for {saved['filename']}: {result.get('error')}")
+            record_processing_error(receipt_file, result)
+            status = "failed"
+
+        db.session.commit()
+        return status
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Database error during ingestion: {str(e)}")
+        # The drop file is saved again when it is retried
+        _discard(saved["file_path"])
+        return "error"
+
+
+def watch(directory, workers=2, max_pending=None, settle=2.0, poll_interval=2.0,
+          rescan_interval=60.0, checkpoint_path=None, use_polling=False, once=False):
+    """
+    Watch ``directory`` and ingest every PDF that appears in it. Must be
+    called within an app context.
+
+    A file is picked up once its size and mtime have not changed for
+    ``settle`` seconds, so partially written files are left alone. At most
+    ``max_pending`` files are in flight; further files wait in the directory
+    until a worker frees up. With inotify, the directory is still fully
+    rescanned every ``rescan_interval`` seconds in case events were dropped.
+    Files that fail with an error are retried with exponential backoff.
+
+    Returns the number of files whose last attempt ended in an error; this
+    only happens with ``once``, which does not retry them.
+    """
+    app = current_app._get_current_object()
+    directory = os.path.abspath(directory)
+    max_pending = max_pending or workers * 2
+    checkpoint = Checkpoint(checkpoint_path or os.path.join(directory, CHECKPOINT_NAME))
+
+    changed = set()
+    wake = threading.Event()
+    observer = None
+    if not use_polling and Observer is not None:
+        observer = Observer()
+        observer.schedule(_DropHandler(changed, wake), directory, recursive=False)
+        observer.start()
+        logger.info(f"Watching {directory} with inotify")
+    else:
+        logger.info(f"Polling {directory} every {poll_interval}s")
+
+    # path -> (size, mtime_ns, time the file was first seen with that size/mtime)
+    pending = {}
+    in_flight = {}
+    # checkpoint key -> (failed attempts, time of the next attempt)
+    failures = {}
+    rescan = True
+    last_scan = time.monotonic()
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            if observer is not None and time.monotonic() - last_scan >= rescan_interval:
+                rescan = True
+            if rescan or observer is None:
+                candidates = {entry.path for entry in os.scandir(directory) if entry.is_file()}
+                rescan = False
+                last_scan = time.monotonic()
+            else:
+                candidates = set()
+                while changed:
+                    candidates.add(changed.pop())
+            candidates.update(pending)
+
+            now = time.monotonic()
+            busy = {path for path, _ in in_flight.values()}
+            for path in candidates:
+                if path in busy or not _is_candidate(os.path.basename(path)):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    pending.pop(path, None)
+                    continue
+                key = _checkpoint_key(path, stat)
+                if key in checkpoint:
+                    pending.pop(path, None)
+                    continue
+                if key in failures and (once or now < failures[key][1]):
+                    continue
+
+                seen = pending.get(path)
+                if not seen or seen[:2] != (stat.st_size, stat.st_mtime_ns):
+                    pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+                elif now - seen[2] >= settle and len(in_flight) < max_pending:
+                    del pending[path]
+                    future = executor.submit(_ingest, app, path)
+                    in_flight[future] = (path, key)
+
+            # Backpressure: block on workers instead of queueing more files
+            if in_flight:
+                done, _ = wait(in_flight, timeout=0 if len(in_flight) < max_pending else poll_interval,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, key = in_flight.pop(future)
+                    try:
+                        status = _record(future.result())
+                    except Exception as e:
+                        logger.error(f"Ingestion error for {path}: {str(e)}")
+                        status = "error"
+                    logger.info(f"Ingested {os.path.basename(path)}: {status}")
+                    # Errors are not checkpointed, so the file is picked up
+                    # again by a later scan once its backoff has expired
+                    if status != "error":
+                        failures.pop(key, None)
+                        checkpoint.mark(key, status)
+                        checkpoint.save()
+                    else:
+                        attempts = failures.get(key, (0, 0))[0] + 1
+                        delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+                        failures[key] = (attempts, time.monotonic() + delay)
+                        if not once:
+                            logger.info(f"Retrying {os.path.basename(path)} in {delay:.0f}s")
+
+            if once and not pending and not in_flight:
+                break
+
+            # Wake early on inotify events, but re-check pending files for settling
+            wake.wait(min(poll_interval, settle) if pending or in_flight else poll_interval)
+            wake.clear()
+    finally:
+        # On an interrupt, drop the queued files; just the ones already
+        # running are awaited
+        executor.shutdown(wait=True, cancel_futures=True)
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+    return len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest PDF receipts dropped into a directory.")
+    parser.add_argument("directory", help="Directory to watch for new PDF files")
+    parser.add_argument("--workers", type=int, default=2, help="Number of files processed concurrently")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Maximum files in flight before new files are held back (default: 2x workers)")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="Seconds a file must stay unchanged before it is ingested")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between directory scans")
+    parser.add_argument("--rescan-interval", type=float, default=60.0,
+                        help="Seconds between full directory scans when using inotify, "
+                             "to pick up files whose events were lost")
+    parser.add_argument("--checkpoint", default=None,
+                        help=f"Checkpoint file (default: <directory>/{CHECKPOINT_NAME})")
+    parser.add_argument("--poll", action="store_true",
+                        help="Always poll instead of using inotify (e.g. for network shares)")
+    parser.add_argument("--once", action="store_true",
+                        help="Ingest the files currently in the directory and exit")
+    args = parser.parse_args()
+
+    with create_app().app_context():
+        failed = watch(args.directory, workers=args.workers, max_pending=args.max_pending, settle=args.settle,
+                       poll_interval=args.poll_interval, rescan_interval=args.rescan_interval,
+                       checkpoint_path=args.checkpoint,
+                       use_polling=args.poll, once=args.once)
+    if failed:
+        logger.error(f"{failed} files could not be ingested")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()